@@ -9,116 +9,331 @@ attribute values for latitude/longitude/elevation (namespace- and case-insensiti
 Also optionally normalizes <stream> azimuth/dip/sampleRate.
 
 Usage:
-  python check_inventory.py --in seiscomp_inventory.xml --out fixed_sc3ml.xml [--fix-channels]
+  python check_inventory.py --in seiscomp_inventory.xml --out fixed_sc3ml.xml [--fix-channels] [--mirror-children] [--verify] [--stream] [--jobs N] [--low-memory]
+  python check_inventory.py --in seiscomp_inventory.xml --verify-only
 """
 
 import argparse
 import gzip
 import io
-import xml.etree.ElementTree as ET
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from xml.parsers import expat
+from xml.sax.saxutils import escape
 
-def local(tag: str) -> str:
+try:
+    from lxml import etree as ET
+    HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAVE_LXML = False
+    # ElementTree silently falls back to pure Python if _elementtree is missing
+    if ET.Element is getattr(ET, "_Element_Py", ET.Element):
+        print("note: lxml and the _elementtree C accelerator are unavailable; "
+              "parsing large inventories will be slow", file=sys.stderr)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Local tag names we dispatch on during the walks
+_INVENTORY = "inventory"
+_NETWORK = "network"
+_STATION = "station"
+_SENSORLOCATION = "sensorlocation"
+_STREAM = "stream"
+
+# An inventory only uses a few dozen distinct tags, so memoize local()
+_local_cache = {}
+
+def local(tag: str, _cache=_local_cache) -> str:
     """Return local (namespace-stripped) tag name in lowercase."""
-    if "}" in tag:
-        tag = tag.split("}", 1)[1]
-    return tag.lower()
+    v = _cache.get(tag)
+    if v is None:
+        if isinstance(tag, str):
+            v = tag.rsplit("}", 1)[-1].lower()
+        else:
+            # lxml exposes comments/PIs with a factory function as tag
+            v = ""
+        _cache[tag] = v
+    return v
 
 def get_child(elem, name_lc: str):
     """Find first child by local name (case-insensitive)."""
-    for c in list(elem):
+    for c in elem:
         if local(c.tag) == name_lc:
             return c
     return None
 
-def get_child_text(elem, name_lc: str) -> str:
-    c = get_child(elem, name_lc)
+def index_children(elem) -> dict:
+    """Map local name -> first child with that name, built in a single pass."""
+    d = {}
+    for c in elem:
+        d.setdefault(local(c.tag), c)
+    return d
+
+def text_of(c) -> str:
     return (c.text or "").strip() if c is not None else ""
 
-def ensure_child(elem, name_lc: str):
-    c = get_child(elem, name_lc)
+def iter_networks(root):
+    """All <network> elements at any depth below (and including) root."""
+    return (e for e in root.iter() if local(e.tag) == _NETWORK)
+
+def iter_children(elem, name_lc: str):
+    """Direct children with the given local name (case-insensitive)."""
+    return (c for c in elem if local(c.tag) == name_lc)
+
+def get_child_text(elem, name_lc: str) -> str:
+    return text_of(get_child(elem, name_lc))
+
+def ns_of(tag: str) -> str:
+    """Namespace part of a Clark-notation tag including braces ("{uri}"), or ""."""
+    return tag[:tag.index("}") + 1] if tag.startswith("{") else ""
+
+def ensure_child(elem, name_lc: str, kids: dict = None, ns: str = None):
+    """
+    Return child by local name, creating it if missing. If kids (from
+    index_children) is given it is used for the lookup and kept up to date.
+    New children get namespace ns ("{uri}"), by default the parent's.
+    """
+    c = kids.get(name_lc) if kids is not None else get_child(elem, name_lc)
     if c is None:
-        # Reuse parent's namespace if any
-        ns = ""
-        if "}" in elem.tag:
-            ns = elem.tag.split("}", 1)[0] + "}"
+        if ns is None:
+            ns = ns_of(elem.tag)
         c = ET.SubElement(elem, ns + name_lc)
+        if kids is not None:
+            kids[name_lc] = c
     return c
 
+# Decimal/scientific notation with ASCII digits, or the special values
+# float() also accepts (NaN, INF, -INF, infinity in any case); avoids raising
+# and catching ValueError for every non-numeric value
+_num_match = re.compile(r"[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|(?i:inf(?:inity)?|nan))",
+                        re.ASCII).fullmatch
+
 def is_float(s: str) -> bool:
-    try:
-        float(s)
-        return True
-    except Exception:
-        return False
+    return _num_match(s) is not None
+
+# Only batches made of these characters go through numpy, where float
+# parsing agrees with _num_match; anything else (nan, inf, "1_0",
+# whitespace, non-ASCII digits) is checked value by value
+_non_numeric_char = re.compile(r"[^0-9eE.+-]").search
+
+def numeric_flags(values: list) -> list:
+    """
+    is_float() for each string in values. With numpy the whole batch is
+    first converted at once; only if that fails are the values checked one
+    by one.
+    """
+    if np is not None and values and not _non_numeric_char("".join(values)):
+        try:
+            np.array(values, dtype=np.float64)
+            return [True] * len(values)
+        except ValueError:
+            pass
+    return [is_float(v) for v in values]
 
 def norm_num_or_default(s: str, default: str = "0.0") -> str:
     return s if is_float(s) else default
 
+def make_parser():
+    """XML parser for the active backend (libxml2 limits lifted for big inventories)."""
+    if HAVE_LXML:
+        return ET.XMLParser(huge_tree=True, collect_ids=False)
+    return ET.XMLParser(target=ET.TreeBuilder())
+
 def read_xml_maybe_gz(path: Path) -> ET.ElementTree:
     if path.suffix.lower() == ".gz":
+        # Hand the GzipFile to the parser so it decompresses in chunks
         with gzip.open(path, "rb") as fh:
-            data = fh.read()
-        return ET.parse(io.BytesIO(data))
-    return ET.parse(path)
+            return ET.parse(fh, parser=make_parser())
+    return ET.parse(str(path), parser=make_parser())
+
+def open_maybe_gz(path: Path, mode: str = "rb"):
+    if path.suffix.lower() == ".gz":
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+@contextmanager
+def replacing(path: Path):
+    """
+    Yield a temporary path next to path that replaces it only once the block
+    has finished, so a failed run (or --out naming the input) never leaves a
+    truncated file behind. The suffix is kept for open_maybe_gz().
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp{path.suffix}")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+
+def iterparse_maybe_gz(fh, events, tag=None):
+    """iterparse over fh; tag (lxml only) filters events at the C level."""
+    if HAVE_LXML:
+        return ET.iterparse(fh, events=events, tag=tag, huge_tree=True)
+    return ET.iterparse(fh, events=events)
+
+def _drop_previous_siblings(elem):
+    """Free already processed siblings before elem (lxml only)."""
+    parent = elem.getparent()
+    if parent is None:
+        return  # the root; anything before it is a comment or PI
+    while elem.getprevious() is not None:
+        del parent[0]
+
+def _tag_casings(*names) -> list:
+    """
+    lxml tag filters for names in any namespace. libxml2 matches tags
+    case-sensitively, so cover the spellings met in practice.
+    """
+    return ["{*}" + v for nm in names for v in (nm, nm.capitalize(), nm.upper())]
+
+def verify_stations(path: Path):
+    """
+    Stream through an SC3ML file and check that every <station> carries numeric
+    latitude/longitude/elevation attributes. Elements are cleared as soon as
+    they are closed; only the station codes and coordinate strings are kept
+    and validated in one batch at the end.
+    With lxml only <network>/<station>/<code> events reach Python (tag
+    filter); the stdlib parser reports every element and filters on local().
+    Returns (station_count, bad_count, example) where example is the first
+    good station as (network, station, lat, lon, elev) or None. The network
+    code falls back to the network's <code> child like in fix_network().
+    """
+    net_codes = [""]    # one per network, stations outside any network use ""
+    stations = []       # (index into net_codes, station code)
+    lats, lons, eles = [], [], []
+    depth = net_depth = 0
+    tags = _tag_casings(_NETWORK, _STATION, "code") if HAVE_LXML else None
+    with open_maybe_gz(path) as fh:
+        for event, elem in iterparse_maybe_gz(fh, ("start", "end"), tags):
+            name = local(elem.tag)
+            if event == "start":
+                depth += 1
+                if name == _NETWORK:
+                    net_codes.append(elem.attrib.get("code", ""))
+                    net_depth = depth
+                    if HAVE_LXML:
+                        # sensors/responses etc. before the network are done
+                        _drop_previous_siblings(elem)
+                continue
+            depth -= 1
+            if name == _STATION:
+                stations.append((len(net_codes) - 1, elem.attrib.get("code", "")))
+                lats.append((elem.attrib.get("latitude") or "").strip())
+                lons.append((elem.attrib.get("longitude") or "").strip())
+                eles.append((elem.attrib.get("elevation") or "").strip())
+            elif name == "code" and not net_codes[-1]:
+                if HAVE_LXML:
+                    parent = elem.getparent()
+                    is_net_code = parent is not None and local(parent.tag) == _NETWORK
+                else:
+                    # the stdlib parser reports every start, so depth is exact
+                    is_net_code = depth == net_depth
+                if is_net_code:
+                    net_codes[-1] = text_of(elem)
+            elif name == _NETWORK:
+                net_depth = -1
+            if HAVE_LXML:
+                elem.clear(keep_tail=True)
+                _drop_previous_siblings(elem)
+            else:
+                elem.clear()
+
+    bad = 0
+    example = None
+    ok = zip(numeric_flags(lats), numeric_flags(lons), numeric_flags(eles))
+    for i, (lat_ok, lon_ok, ele_ok) in enumerate(ok):
+        if not (lat_ok and lon_ok and ele_ok):
+            bad += 1
+        elif example is None:
+            net_i, sta_code = stations[i]
+            example = (net_codes[net_i], sta_code, lats[i], lons[i], eles[i])
+    return len(stations), bad, example
 
 def write_xml(path: Path, tree: ET.ElementTree):
     if path.suffix.lower() == ".gz":
-        buf = io.BytesIO()
-        tree.write(buf, encoding="UTF-8", xml_declaration=True)
+        # Serialize straight into the compressor, no intermediate buffer
         with gzip.open(path, "wb") as gz:
-            gz.write(buf.getvalue())
+            tree.write(gz, encoding="UTF-8", xml_declaration=True)
     else:
-        tree.write(path, encoding="UTF-8", xml_declaration=True)
+        tree.write(str(path), encoding="UTF-8", xml_declaration=True)
 
-def force_station_numeric_attrs(sta) -> bool:
+def force_station_numeric_attrs(sta, mirror_children: bool = False, ns: str = None) -> bool:
     """
     Ensure <station> has numeric attributes latitude/longitude/elevation.
+    With mirror_children the values are also written to <latitude>/... children.
     Returns True if changed / ensured.
     """
-    # Pull from attribute or child, then coerce to numeric string
-    lat = (sta.attrib.get("latitude", "") or get_child_text(sta, "latitude")).strip()
-    lon = (sta.attrib.get("longitude", "") or get_child_text(sta, "longitude")).strip()
-    ele = (sta.attrib.get("elevation", "") or get_child_text(sta, "elevation")).strip()
+    kids = index_children(sta)
+    a = sta.attrib
+    changed = fix_station_attrib(a, lambda nm: text_of(kids.get(nm)))
+
+    # Mirror into child elements (defensive), only touching the ones that differ
+    if mirror_children:
+        for nm in ("latitude", "longitude", "elevation"):
+            val = a[nm]
+            c = kids.get(nm)
+            if c is None or c.text != val:
+                ensure_child(sta, nm, kids, ns).text = val
+
+    return changed
+
+def fix_station_attrib(a, child_text) -> bool:
+    """
+    Apply the station fixes to an attribute mapping: numeric
+    latitude/longitude/elevation and a code attribute. child_text(name)
+    returns the stripped text of the station's child of that name ("" if
+    none). Returns True if a was changed.
+    """
+    lat0 = a.get("latitude", "")
+    lon0 = a.get("longitude", "")
+    ele0 = a.get("elevation", "")
 
-    lat = norm_num_or_default(lat, "0.0")
-    lon = norm_num_or_default(lon, "0.0")
-    ele = norm_num_or_default(ele, "0.0")
+    # Pull from attribute or child, then coerce to numeric string
+    lat = norm_num_or_default((lat0 or child_text("latitude")).strip(), "0.0")
+    lon = norm_num_or_default((lon0 or child_text("longitude")).strip(), "0.0")
+    ele = norm_num_or_default((ele0 or child_text("elevation")).strip(), "0.0")
 
     # Set attributes (ObsPy reads attributes)
     changed = False
-    if sta.attrib.get("latitude") != lat:
-        sta.set("latitude", lat); changed = True
-    if sta.attrib.get("longitude") != lon:
-        sta.set("longitude", lon); changed = True
-    if sta.attrib.get("elevation") != ele:
-        sta.set("elevation", ele); changed = True
-
-    # Mirror into child elements (defensive)
-    ensure_child(sta, "latitude").text = lat
-    ensure_child(sta, "longitude").text = lon
-    ensure_child(sta, "elevation").text = ele
+    if lat0 != lat:
+        a["latitude"] = lat; changed = True
+    if lon0 != lon:
+        a["longitude"] = lon; changed = True
+    if ele0 != ele:
+        a["elevation"] = ele; changed = True
 
     # Ensure station code attribute if only present as child
-    if "code" not in sta.attrib or not sta.attrib["code"]:
-        sc = get_child_text(sta, "code")
+    if not a.get("code"):
+        sc = child_text("code")
         if sc:
-            sta.set("code", sc)
+            a["code"] = sc
             changed = True
 
     return changed
 
-def fix_stream(stream):
+def fix_stream(stream, ns: str = None):
+    kids = index_children(stream)
     # azimuth / dip defaults
     for nm in ("azimuth", "dip"):
-        e = ensure_child(stream, nm)
-        if not is_float((e.text or "").strip()):
+        e = ensure_child(stream, nm, kids, ns)
+        if not is_float(text_of(e)):
             e.text = "0.0"
     # sampleRate: from sampleRate or numerator/denominator
-    sr = get_child(stream, "samplerate")
-    if sr is None or not is_float((sr.text or "").strip()):
-        num = get_child_text(stream, "sampleratenumerator")
-        den = get_child_text(stream, "sampleratedenominator")
+    sr = kids.get("samplerate")
+    if sr is None or not is_float(text_of(sr)):
+        num = text_of(kids.get("sampleratenumerator"))
+        den = text_of(kids.get("sampleratedenominator"))
         try:
             fnum = float(num) if is_float(num) else 1.0
             fden = float(den) if is_float(den) and float(den) != 0.0 else 1.0
@@ -126,87 +341,503 @@ def fix_stream(stream):
         except Exception:
             val = 1.0
         if sr is None:
-            sr = ensure_child(stream, "samplerate")
-        sr.text = f"{val:.6f}"
+            sr = ensure_child(stream, "samplerate", kids, ns)
+        sr.text = "%.6f" % val
     # ensure code attribute
     if "code" not in stream.attrib or not stream.attrib["code"]:
-        cc = get_child_text(stream, "code")
+        cc = text_of(kids.get("code"))
         if cc:
             stream.set("code", cc)
 
-def main():
-    ap = argparse.ArgumentParser(description="Force numeric station attrs in SC3ML (namespace/case-insensitive).")
-    ap.add_argument("--in", dest="infile", required=True, help="Input SC3ML (.xml or .xml.gz)")
-    ap.add_argument("--out", dest="outfile", required=True, help="Output SC3ML (.xml or .xml.gz)")
-    ap.add_argument("--fix-channels", action="store_true", help="Also normalize stream azimuth/dip/sampleRate")
-    args = ap.parse_args()
+def new_stats() -> dict:
+    return {"stations": 0, "fixed": 0, "streams": 0, "bad": 0, "example": None}
 
-    inp = Path(args.infile); outp = Path(args.outfile)
-    if not inp.exists():
-        raise SystemExit(f"Input not found: {inp}")
+def fix_station(sta, net_code: str, stats: dict, fix_channels: bool, mirror_children: bool,
+                ns: str = None):
+    """
+    Fix one <station> (and its streams if requested), updating stats.
+    ns is the document namespace for created children (see ns_of()).
+    """
+    changed = force_station_numeric_attrs(sta, mirror_children, ns)
+    count_station(stats, net_code, sta.attrib, changed)
+    if fix_channels:
+        for sl in iter_children(sta, _SENSORLOCATION):
+            if "code" not in sl.attrib or not sl.attrib["code"]:
+                lc = get_child_text(sl, "code")
+                if lc: sl.set("code", lc)
+            for stream in iter_children(sl, _STREAM):
+                fix_stream(stream, ns); stats["streams"] += 1
+
+def count_station(stats: dict, net_code: str, a, changed: bool):
+    """Account for one fixed station (attribute mapping a) in stats."""
+    stats["stations"] += 1
+    if changed:
+        stats["fixed"] += 1
+    lat = a.get("latitude", "")
+    lon = a.get("longitude", "")
+    ele = a.get("elevation", "")
+    if not (is_float(lat) and is_float(lon) and is_float(ele)):
+        stats["bad"] += 1
+    elif stats["example"] is None:
+        stats["example"] = (net_code, a.get("code", ""), lat, lon, ele)
+
+def fix_network(net, stats: dict, fix_channels: bool, mirror_children: bool, ns: str = None):
+    # Ensure network code attr from child if missing
+    if "code" not in net.attrib or not net.attrib["code"]:
+        nc = get_child_text(net, "code")
+        if nc:
+            net.set("code", nc)
+    net_code = net.attrib.get("code", "")
+    for sta in iter_children(net, _STATION):
+        fix_station(sta, net_code, stats, fix_channels, mirror_children, ns)
+
+def merge_stats(stats: dict, other: dict):
+    for k in ("stations", "fixed", "streams", "bad"):
+        stats[k] += other[k]
+    if stats["example"] is None:
+        stats["example"] = other["example"]
+
+def _fix_network_bytes(data: bytes, fix_channels: bool, mirror_children: bool, ns: str):
+    """Worker side of fix_networks_parallel(): fix one serialized <network>."""
+    net = ET.fromstring(data, parser=make_parser())
+    stats = new_stats()
+    fix_network(net, stats, fix_channels, mirror_children, ns)
+    return ET.tostring(net), stats
 
-    tree = read_xml_maybe_gz(inp)
-    root = tree.getroot()
-
-    stations_total = 0
-    stations_fixed = 0
-    streams_touched = 0
-
-    # Walk networks/stations/sensorlocations/streams with namespace/case independence
-    for net in root.iter():
-        if local(net.tag) != "network":
-            continue
-        # Ensure network code attr from child if missing
-        if "code" not in net.attrib or not net.attrib["code"]:
-            nc = get_child_text(net, "code")
-            if nc:
-                net.set("code", nc)
-        for sta in list(net):
-            if local(sta.tag) != "station":
+def fix_networks_parallel(root, stats: dict, fix_channels: bool, mirror_children: bool, jobs: int):
+    """
+    Fix networks in a process pool. Each <network> is shipped to a worker as
+    bytes and the fixed copy is put back in its place. That round trip alone
+    costs about as much as fixing the stations, so this only pays off with
+    --fix-channels on several cores. Stats are merged in document order so
+    the example station matches a serial run. Only a few networks per worker
+    are serialized and in flight at any time.
+    """
+    ns = ns_of(root.tag)
+    if HAVE_LXML:
+        slots = None
+        nets = [n for n in iter_networks(root) if n.getparent() is not None]
+    else:
+        # ElementTree has no getparent(); remember (parent, index) instead
+        slots = {c: (p, i) for p in root.iter() for i, c in enumerate(p) if local(c.tag) == _NETWORK}
+        nets = list(slots)
+
+    todo = iter(nets)
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        def submit(net):
+            in_flight.append((net, pool.submit(_fix_network_bytes, ET.tostring(net),
+                                               fix_channels, mirror_children, ns)))
+
+        for net in todo:
+            submit(net)
+            if len(in_flight) >= 2 * jobs:
+                break
+        while in_flight:
+            net, fut = in_flight.popleft()
+            data, net_stats = fut.result()
+            fixed = ET.fromstring(data, parser=make_parser())
+            fixed.tail = net.tail
+            if slots is None:
+                net.getparent().replace(net, fixed)
+            else:
+                parent, i = slots[net]
+                parent[i] = fixed
+            merge_stats(stats, net_stats)
+            nxt = next(todo, None)
+            if nxt is not None:
+                submit(nxt)
+
+def stream_fix(inp: Path, outp: Path, stats: dict, fix_channels: bool, mirror_children: bool):
+    """
+    Fix an inventory without holding it in memory (lxml only).
+
+    The root, <Inventory> and every <network> that already has a code
+    attribute are opened on the output as soon as they start; each of their
+    children is written with lxml's incremental xmlfile writer once it is
+    complete and then dropped from the tree. Stations are fixed just before
+    they are written, so memory is bounded by the largest station or
+    non-network subtree rather than by the inventory. A network without a
+    code attribute is buffered and fixed as a whole, since its code may still
+    come from a child element.
+    """
+    # One entry per open output element: [element, entered xf.element(),
+    # is network, pending], where pending is what is still to be written
+    # for that element once the text/tail before its next child is known
+    open_elems = []
+    root_done = False
+    ns = ""
+
+    def flush(top):
+        pending = top[3]
+        if pending is None:
+            return
+        kind, elem = pending
+        if kind == "text":
+            if elem.text:
+                xf.write(elem.text)
+        elif kind == "tail":
+            if elem.tail:
+                xf.write(elem.tail)
+        else:
+            xf.write(elem)
+            parent = elem.getparent()
+            if parent is not None:
+                parent.remove(elem)
+        top[3] = None
+
+    with open_maybe_gz(inp) as src, open_maybe_gz(outp, "wb") as dst, \
+            ET.xmlfile(dst, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        for event, elem in ET.iterparse(src, events=("start", "end", "comment", "pi"),
+                                        huge_tree=True):
+            parent = elem.getparent()
+            top = open_elems[-1] if open_elems else None
+            in_open = top is not None and parent is top[0]
+
+            if event == "start":
+                if parent is not None and not in_open:
+                    continue
+                if top is not None:
+                    flush(top)
+                name = local(elem.tag)
+                is_net = name == _NETWORK and bool(elem.attrib.get("code"))
+                if parent is None or name == _INVENTORY or is_net:
+                    if parent is None:
+                        ns = ns_of(elem.tag)
+                        nsmap = elem.nsmap
+                    else:
+                        nsmap = {k: v for k, v in elem.nsmap.items() if parent.nsmap.get(k) != v}
+                    cm = xf.element(elem.tag, dict(elem.attrib), nsmap=nsmap or None)
+                    cm.__enter__()
+                    open_elems.append([elem, cm, is_net, ("text", elem)])
                 continue
-            stations_total += 1
-            if force_station_numeric_attrs(sta):
-                stations_fixed += 1
-            if args.fix_channels:
-                for sl in list(sta):
-                    if local(sl.tag) != "sensorlocation":
-                        continue
-                    if "code" not in sl.attrib or not sl.attrib["code"]:
-                        lc = get_child_text(sl, "code")
-                        if lc: sl.set("code", lc)
-                    for stream in list(sl):
-                        if local(stream.tag) != "stream":
-                            continue
-                        fix_stream(stream); streams_touched += 1
-
-    write_xml(outp, tree)
-
-    # Verify result file contains stations with numeric attrs
-    tree2 = read_xml_maybe_gz(outp)
-    root2 = tree2.getroot()
-    bad = 0
-    example = None
-    for net in root2.iter():
-        if local(net.tag) != "network":
-            continue
-        for sta in list(net):
-            if local(sta.tag) != "station":
+
+            if event == "end" and top is not None and elem is top[0]:
+                flush(top)
+                open_elems.pop()
+                top[1].__exit__(None, None, None)
+                if open_elems:
+                    open_elems[-1][3] = ("tail", elem)
+                else:
+                    root_done = True
                 continue
-            lat = (sta.attrib.get("latitude") or "").strip()
-            lon = (sta.attrib.get("longitude") or "").strip()
-            ele = (sta.attrib.get("elevation") or "").strip()
-            if not (is_float(lat) and is_float(lon) and is_float(ele)):
-                bad += 1
-            elif example is None:
-                example = (net.attrib.get("code",""), sta.attrib.get("code",""), lat, lon, ele)
-
-    print(f"Stations found: {stations_total}, stations fixed: {stations_fixed}, streams touched: {streams_touched}")
+
+            if parent is None and not open_elems:
+                # comment/PI outside the root element; xmlfile cannot append
+                # anything once the root has been closed
+                if not root_done:
+                    xf.write(elem)
+                continue
+            if not in_open:
+                continue
+            if event == "end":
+                name = local(elem.tag)
+                if top[2] and name == _STATION:
+                    fix_station(elem, top[0].attrib.get("code", ""), stats, fix_channels,
+                                mirror_children, ns)
+                elif name == _NETWORK:
+                    fix_network(elem, stats, fix_channels, mirror_children, ns)
+            flush(top)
+            top[3] = ("item", elem)
+
+# Attribute values are written in double quotes; keep whitespace that expat
+# would otherwise normalize away on the next read
+_ATTR_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+_STATION_TEXT_CHILDREN = ("latitude", "longitude", "elevation", "code")
+
+def _attrs_xml(items) -> str:
+    return "".join(f' {k}="{escape(v, _ATTR_ENTITIES)}"' for k, v in items)
+
+class _ExpatRewriter:
+    """
+    expat handlers for low_memory_fix(). Everything is copied to the output as
+    it is parsed; only the current <station> is held back (as a list of output
+    pieces) until its end tag, when its attributes can be fixed. A <network>
+    without a code attribute is held back as a whole the same way, since its
+    code may still come from a <code> child (as in stream_fix()).
+    """
+
+    def __init__(self, write, stats: dict, mirror_children: bool):
+        self.write = write          # output sink
+        self.sink = write           # where finished pieces go: output or network buffer
+        self.out = write            # current sink: self.sink or station buffer
+        self.stats = stats
+        self.mirror_children = mirror_children
+        self.open_tag = False       # last start tag still lacks its ">"
+        self.net_code = ""
+        self.network = None         # (qname, attribute items) while held back
+        self.net_buf = None
+        self.net_depth = 0          # element depth below the held network
+        self.net_text = None        # text parts of its first <code> child while read
+        self.net_child_code = None
+        self.net_stations = None    # (attributes, changed) to count once the code is known
+        self.station = None         # (qname, attribute dict) while held back
+        self.buf = None
+        self.depth = 0              # element depth below the held station
+        self.texts = {}             # text of the first latitude/.../code children
+        self.text_child = None      # which of those is being read
+        self.text_parts = None
+
+    def _close_tag(self):
+        if self.open_tag:
+            self.out(">")
+            self.open_tag = False
+
+    def start(self, name, attrs):
+        self._close_tag()
+        lname = name.rsplit(":", 1)[-1].lower()
+        items = list(zip(attrs[0::2], attrs[1::2]))
+        if self.network is not None:
+            self.net_depth += 1
+        if self.station is None:
+            if lname == _STATION:
+                self.station = (name, dict(items))
+                self.buf = []
+                self.out = self.buf.append
+                self.depth = 0
+                self.texts = {}
+                return
+            if lname == _NETWORK and self.network is None:
+                self.net_code = dict(items).get("code", "")
+                if not self.net_code:
+                    self.network = (name, items)
+                    self.net_buf = []
+                    self.sink = self.out = self.net_buf.append
+                    self.net_depth = 0
+                    self.net_child_code = None
+                    self.net_stations = []
+                    return
+            elif (self.network is not None and self.net_depth == 1 and lname == "code"
+                    and self.net_child_code is None and self.net_text is None):
+                self.net_text = []
+            self.out("<" + name + _attrs_xml(items))
+            self.open_tag = True
+            return
+        self.depth += 1
+        if self.depth == 1 and lname in _STATION_TEXT_CHILDREN and lname not in self.texts:
+            self.texts[lname] = ""
+            self.text_child = lname
+            self.text_parts = []
+            self.out("<" + name + _attrs_xml(items) + ">")
+            return
+        self.out("<" + name + _attrs_xml(items))
+        self.open_tag = True
+
+    def end(self, name):
+        if self.network is not None:
+            if self.net_depth == 0:
+                self._end_network()
+                return
+            if self.net_depth == 1 and self.net_text is not None:
+                self.net_child_code = "".join(self.net_text).strip()
+                self.net_text = None
+            self.net_depth -= 1
+        if self.station is not None:
+            if self.depth == 0:
+                self._end_station()
+                return
+            if self.depth == 1 and self.text_child is not None:
+                # Placeholder for the child's text, filled in by _end_station()
+                self.texts[self.text_child] = "".join(self.text_parts)
+                self.out((self.text_child,))
+                self.out("</" + name + ">")
+                self.text_child = None
+                self.depth -= 1
+                return
+            self.depth -= 1
+        if self.open_tag:
+            self.out("/>")
+            self.open_tag = False
+        else:
+            self.out("</" + name + ">")
+
+    def data(self, text):
+        if self.net_text is not None and self.net_depth == 1:
+            self.net_text.append(text)
+        if self.text_child is not None and self.depth == 1:
+            self.text_parts.append(text)
+            return
+        self._close_tag()
+        self.out(escape(text, {"\r": "&#13;"}))
+
+    def comment(self, text):
+        self._close_tag()
+        self.out("<!--" + text + "-->")
+
+    def pi(self, target, data):
+        self._close_tag()
+        self.out("<?" + target + (" " + data if data else "") + "?>")
+
+    def _end_station(self):
+        qname, a = self.station
+        texts = self.texts
+        changed = fix_station_attrib(a, lambda nm: texts.get(nm, "").strip())
+        if self.network is not None:
+            self.net_stations.append((a, changed))
+        else:
+            count_station(self.stats, self.net_code, a, changed)
+
+        prefix = qname[:qname.index(":") + 1] if ":" in qname else ""
+        extra = ""
+        if self.mirror_children:
+            extra = "".join(f"<{prefix}{nm}>{escape(a[nm])}</{prefix}{nm}>"
+                            for nm in ("latitude", "longitude", "elevation") if nm not in texts)
+
+        write = self.sink
+        write("<" + qname + _attrs_xml(a.items()))
+        if not self.buf and not extra:
+            write("/>")
+        else:
+            write(">")
+            for piece in self.buf:
+                if isinstance(piece, tuple):
+                    nm = piece[0]
+                    text = texts[nm]
+                    if self.mirror_children and nm != "code":
+                        text = a[nm]
+                    piece = escape(text, {"\r": "&#13;"})
+                write(piece)
+            write(extra + "</" + qname + ">")
+        self.station = None
+        self.buf = None
+        self.out = write
+
+    def _end_network(self):
+        qname, items = self.network
+        code = self.net_child_code or ""
+        if code:
+            a = dict(items)
+            a["code"] = code
+            items = a.items()
+        self.net_code = code
+        for a, changed in self.net_stations:
+            count_station(self.stats, code, a, changed)
+
+        write = self.write
+        write("<" + qname + _attrs_xml(items))
+        if self.net_buf:
+            write(">")
+            for piece in self.net_buf:
+                write(piece)
+            write("</" + qname + ">")
+        else:
+            write("/>")
+        self.network = None
+        self.net_buf = None
+        self.net_stations = None
+        self.sink = self.out = write
+
+def low_memory_fix(inp: Path, outp: Path, stats: dict, mirror_children: bool):
+    """
+    Fix station and network attributes in a single expat pass without
+    building a tree and without lxml. Memory is bounded by the largest
+    <station> (or network without a code attribute); everything else is
+    copied through as parsed. Streams are not touched in this mode.
+    """
+    with open_maybe_gz(inp) as src, open_maybe_gz(outp, "wb") as raw, \
+            io.TextIOWrapper(raw, encoding="utf-8", newline="") as dst:
+        dst.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+        rw = _ExpatRewriter(dst.write, stats, mirror_children)
+        p = expat.ParserCreate()
+        p.buffer_text = True
+        p.ordered_attributes = True
+        p.StartElementHandler = rw.start
+        p.EndElementHandler = rw.end
+        p.CharacterDataHandler = rw.data
+        p.CommentHandler = rw.comment
+        p.ProcessingInstructionHandler = rw.pi
+        p.ParseFile(src)
+
+def report_check(bad: int, example):
     if example:
         n, s, la, lo, el = example
         print(f"Example station OK: Network={n} Station={s} lat={la} lon={lo} elev={el}")
     if bad:
         print(f"WARNING: {bad} station(s) still missing numeric attrs.")
 
+def main():
+    ap = argparse.ArgumentParser(description="Force numeric station attrs in SC3ML (namespace/case-insensitive).")
+    ap.add_argument("--in", dest="infile", required=True, help="Input SC3ML (.xml or .xml.gz)")
+    ap.add_argument("--out", dest="outfile", help="Output SC3ML (.xml or .xml.gz)")
+    ap.add_argument("--fix-channels", action="store_true", help="Also normalize stream azimuth/dip/sampleRate")
+    ap.add_argument("--mirror-children", action="store_true",
+                    help="Also write the fixed values into <latitude>/<longitude>/<elevation> children")
+    ap.add_argument("--verify", action="store_true",
+                    help="Re-read the written file and check every station (slower)")
+    ap.add_argument("--stream", action="store_true",
+                    help="Rewrite incrementally without loading the whole inventory (requires lxml)")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Fix networks in this many worker processes (default 1; only with "
+                         "--fix-channels, and only worth it with that many free CPU cores)")
+    ap.add_argument("--low-memory", action="store_true",
+                    help="Rewrite in a single expat pass with minimal memory and without lxml "
+                         "(no --fix-channels; slower than the default mode with lxml)")
+    ap.add_argument("--verify-only", "--dry-run", dest="verify_only", action="store_true",
+                    help="Only check the input, write nothing; exit status 1 if any station is bad")
+    args = ap.parse_args()
+
+    if not args.verify_only and not args.outfile:
+        ap.error("--out is required unless --verify-only is given")
+
+    if args.stream and not HAVE_LXML:
+        ap.error("--stream requires lxml")
+    if args.jobs < 1:
+        ap.error("--jobs must be at least 1")
+    if args.stream and args.jobs > 1:
+        ap.error("--jobs cannot be combined with --stream")
+    if args.jobs > 1 and not args.fix_channels:
+        # Shipping the networks to the workers and back costs more than the
+        # station fixes themselves
+        ap.error("--jobs only helps together with --fix-channels")
+    if args.low_memory and (args.stream or args.jobs > 1 or args.fix_channels):
+        ap.error("--low-memory cannot be combined with --stream, --jobs or --fix-channels")
+
+    inp = Path(args.infile)
+    if not inp.exists():
+        raise SystemExit(f"Input not found: {inp}")
+
+    if args.verify_only:
+        n_checked, bad, example = verify_stations(inp)
+        print(f"Stations checked: {n_checked}")
+        report_check(bad, example)
+        raise SystemExit(1 if bad else 0)
+
+    outp = Path(args.outfile)
+
+    stats = new_stats()
+
+    if args.low_memory:
+        with replacing(outp) as tmp:
+            low_memory_fix(inp, tmp, stats, args.mirror_children)
+    elif args.stream:
+        with replacing(outp) as tmp:
+            stream_fix(inp, tmp, stats, args.fix_channels, args.mirror_children)
+    else:
+        tree = read_xml_maybe_gz(inp)
+        root = tree.getroot()
+
+        # Walk networks/stations/sensorlocations/streams with namespace/case independence
+        if args.jobs > 1:
+            fix_networks_parallel(root, stats, args.fix_channels, args.mirror_children, args.jobs)
+        else:
+            # Namespace for any children we create, derived once from the root
+            ns = ns_of(root.tag)
+            for net in iter_networks(root):
+                fix_network(net, stats, args.fix_channels, args.mirror_children, ns)
+
+        write_xml(outp, tree)
+        # Release the DOM so a --verify pass does not stack on top of it
+        del tree, root
+
+    bad, example = stats["bad"], stats["example"]
+    if args.verify:
+        # Verify result file contains stations with numeric attrs
+        _, bad, example = verify_stations(outp)
+
+    print(f"Stations found: {stats['stations']}, stations fixed: {stats['fixed']}, streams touched: {stats['streams']}")
+    report_check(bad, example)
+
 if __name__ == "__main__":
     main()
 
@@ -6,6 +6,7 @@ List all stations and channels in an inventory file.
 
 from obspy import read_inventory
 import argparse
+import sys
 
 def main():
     ap = argparse.ArgumentParser(description="List all stations in an inventory.")
@@ -14,17 +15,21 @@ def main():
 
     inv = read_inventory(args.inventory)
 
+    # Collect all lines and write them in one go instead of a print() per channel
+    out = []
     for net in inv:
-        print(f"Network: {net.code}")
+        out.append(f"Network: {net.code}")
         for sta in net.stations:
-            print(f"  Station: {sta.code} "
-                  f"(Lat={sta.latitude}, Lon={sta.longitude}, Elev={sta.elevation}) "
-                  f"Start={sta.start_date}, End={sta.end_date}")
+            out.append(f"  Station: {sta.code} "
+                       f"(Lat={sta.latitude}, Lon={sta.longitude}, Elev={sta.elevation}) "
+                       f"Start={sta.start_date}, End={sta.end_date}")
             for ch in sta.channels:
-                print(f"    Channel: {ch.code}, Loc: {ch.location_code or ''}, "
-                      f"SR={ch.sample_rate} Hz, "
-                      f"Start={ch.start_date}, End={ch.end_date}")
-        print()
+                out.append(f"    Channel: {ch.code}, Loc: {ch.location_code or ''}, "
+                           f"SR={ch.sample_rate} Hz, "
+                           f"Start={ch.start_date}, End={ch.end_date}")
+        out.append("")
+    if out:
+        sys.stdout.write("\n".join(out) + "\n")
 
 if __name__ == "__main__":
     main()